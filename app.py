@@ -1,53 +1,260 @@
 import streamlit as st
-import json
+import atexit
+import logging
+import msgspec
+import orjson
+import os
+import pickle
+import threading
+import time
+from collections import deque
 from pathlib import Path
 import pandas as pd
 
-DATA_FILE = Path("pickleball_data.json")
+# Storage format for the data file: "pickle" (fastest) or "msgpack".
+# The file is only ever read and written by this app, so pickle is safe here.
+_BACKEND = "pickle"
+DATA_FILES = {
+    "pickle": Path("pickleball_data.pkl"),
+    "msgpack": Path("pickleball_data.msgpack"),
+}
+DATA_FILE = DATA_FILES[_BACKEND]
+LEGACY_DATA_FILE = Path("pickleball_data.json")
+HISTORY_FILE = Path("pickleball_history.ndjson")
+FLUSH_INTERVAL = 0.1  # seconds to gather changes into one background write
+RETRY_INTERVAL = 5  # seconds to wait before retrying a failed background write
+
+logger = logging.getLogger(__name__)
 
 # ---------------------------
 # Helpers for persistent storage
 # ---------------------------
-def load_json(file_path):
+def empty_data():
+    return {
+        "players": [],
+        "queue": deque(),
+        "courts": [[], [], []],
+        "streaks": {},
+        "auto_fill": False
+    }
+
+def load_data(file_path):
+    # Data may also have been saved with the other backend or as plain JSON;
+    # use whichever copy is newest and rewrite it in the current format.
+    candidates = [
+        f for f in dict.fromkeys((file_path, *DATA_FILES.values(), LEGACY_DATA_FILE))
+        if f.exists()
+    ]
+    if not candidates:
+        return empty_data()
+    source = max(candidates, key=lambda f: f.stat().st_mtime_ns)
+    raw = source.read_bytes()
+    if source.suffix == ".pkl":
+        data = pickle.loads(raw)
+    elif raw[:1] == b"{":
+        data = orjson.loads(raw)
+    else:
+        data = msgspec.msgpack.decode(raw)
+    # Older files kept the game history inline; move it to the log once.
+    history = data.pop("history", None)
+    if history is not None:
+        append_history(HISTORY_FILE, history)
+    if source != file_path or history is not None:
+        save_data(file_path, data)
+    # Move superseded copies aside so they can never be loaded again
+    for f in candidates:
+        if f != file_path:
+            f.replace(f.with_name(f.name + ".bak"))
+    # The queue is a deque at runtime so players can be taken off the front cheaply.
+    data["queue"] = deque(data["queue"])
+    return data
+
+def encode_data(data):
+    state = {**data, "queue": list(data["queue"])}
+    if _BACKEND == "pickle":
+        return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    return msgspec.msgpack.encode(state)
+
+def write_data(file_path, payload):
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+def save_data(file_path, data):
+    write_data(file_path, encode_data(data))
+
+# Pretty-printed JSON is only produced on request, for people who want to
+# read the saved state.
+def export_json(data, history):
+    return orjson.dumps(
+        {**data, "queue": list(data["queue"]), "history": history},
+        option=orjson.OPT_INDENT_2,
+    )
+
+def append_history(file_path, entries):
+    payload = b"".join(orjson.dumps(entry) + b"\n" for entry in entries)
+    with open(file_path, "ab+") as f:
+        # If a crash left the last record unfinished, start on a fresh line
+        # so only that record is lost, not the one being appended.
+        if f.seek(0, os.SEEK_END):
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                payload = b"\n" + payload
+        f.write(payload)
+
+def load_history(file_path):
     if not file_path.exists():
-        return {
-            "players": [],
-            "queue": [],
-            "courts": [[], [], []],
-            "streaks": {},
-            "history": [],
-            "auto_fill": False
-        }
-    with open(file_path, "r") as f:
-        return json.load(f)
-
-def save_json(file_path, data):
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4)
+        return []
+    history = []
+    for line in file_path.read_bytes().splitlines():
+        if not line:
+            continue
+        try:
+            history.append(orjson.loads(line))
+        except orjson.JSONDecodeError:
+            # A line cut short by a crash mid-append; keep the rest of the log
+            continue
+    return history
+
+# mtime and size are only there as the cache key, so the table is rebuilt
+# only after a game has been appended to the log. Only the latest table is
+# ever read, so older ones are not kept.
+@st.cache_data(show_spinner=False, max_entries=1)
+def history_table(file_path, mtime, size):
+    history = load_history(file_path)
+    return pd.DataFrame({
+        "Court": [entry["court"] for entry in history],
+        "Winner": [entry["team_won"] for entry in history],
+        "Player 1": [entry["players"][0] for entry in history],
+        "Player 2": [entry["players"][1] for entry in history],
+        "Player 3": [entry["players"][2] for entry in history],
+        "Player 4": [entry["players"][3] for entry in history],
+    })
+
+# Saves on a background thread so clicks don't wait on disk. Handlers encode
+# a snapshot with submit(); only the newest one is written each interval.
+class DataWriter:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.payload = None
+        self.last_payload = None
+        self.dirty = threading.Event()
+        self.lock = threading.Lock()  # guards payload and dirty
+        self.write_lock = threading.Lock()  # one write to the file at a time
+        self.failing = False
+        threading.Thread(target=self._run, daemon=True).start()
+        # The thread is a daemon, so write any pending snapshot on shutdown
+        atexit.register(self._flush_logged)
+
+    def submit(self, payload):
+        with self.lock:
+            self.payload = payload
+            self.dirty.set()
+
+    def _run(self):
+        while True:
+            self.dirty.wait()
+            # Let changes made in quick succession go out as one write
+            time.sleep(FLUSH_INTERVAL)
+            if not self._flush_logged():
+                time.sleep(RETRY_INTERVAL)
+
+    def _flush_logged(self):
+        try:
+            self.flush()
+        except Exception:
+            # Log once per outage rather than on every retry
+            if not self.failing:
+                logger.exception("Saving %s failed; retrying", self.file_path)
+            self.failing = True
+            return False
+        if self.failing:
+            logger.info("Saving %s succeeded again", self.file_path)
+        self.failing = False
+        return True
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                payload = self.payload
+                self.dirty.clear()
+            if payload is None:
+                return
+            # Skip the write when a click didn't actually change anything
+            if payload == self.last_payload:
+                return
+            try:
+                write_data(self.file_path, payload)
+            except Exception:
+                self.dirty.set()
+                raise
+            self.last_payload = payload
+
+# One copy of the state per process, shared by every session so no session
+# can save over another's changes. Handlers hold the lock while they change it.
+@st.cache_resource(show_spinner=False)
+def load_state(file_path):
+    data = load_data(file_path)
+    return data, set(data["queue"]), threading.Lock()
+
+# One writer per process, so sessions sharing the data file never write it
+# at the same time.
+@st.cache_resource(show_spinner=False)
+def get_writer(file_path):
+    return DataWriter(file_path)
 
 # ---------------------------
 # Initialize session state
 # ---------------------------
 if "initialized" not in st.session_state:
     st.session_state.initialized = True
-    data = load_json(DATA_FILE)
+    data, queue_set, lock = load_state(DATA_FILE)
     st.session_state.data = data
+    st.session_state.queue_set = queue_set
+    st.session_state.lock = lock
+    st.session_state.writer = get_writer(DATA_FILE)
 else:
     data = st.session_state.data
 
 # ---------------------------
 # Utility functions
 # ---------------------------
+# The snapshot is encoded here, on the handler's thread, so the writer never
+# sees a half-applied change.
+def mark_dirty():
+    st.session_state.writer.submit(encode_data(st.session_state.data))
+
+def priority_flush():
+    mark_dirty()
+    st.session_state.writer.flush()
+
+# The court and queue helpers below only mutate the data; the button handlers
+# that call them mark it dirty once at the end.
+
+# queue_set mirrors data["queue"] so membership checks don't scan the list.
+def enqueue(player):
+    if player not in st.session_state.queue_set:
+        st.session_state.data["queue"].append(player)
+        st.session_state.queue_set.add(player)
+
+def dequeue():
+    player = st.session_state.data["queue"].popleft()
+    st.session_state.queue_set.discard(player)
+    return player
+
 def reset_everything():
-    st.session_state.data = {
-        "players": [],
-        "queue": [],
-        "courts": [[], [], []],
-        "streaks": {},
-        "history": [],
-        "auto_fill": False
-    }
-    save_json(DATA_FILE, st.session_state.data)
+    # Reset in place; the dict and set are shared with other sessions
+    with st.session_state.lock:
+        st.session_state.data.clear()
+        st.session_state.data.update(empty_data())
+        st.session_state.queue_set.clear()
+        priority_flush()
+        HISTORY_FILE.unlink(missing_ok=True)
+    # Runs as a button callback, before the checkbox is drawn
+    st.session_state.auto_fill_checkbox = False
     st.success("All data reset!")
 
 def assign_all_courts():
@@ -56,8 +263,7 @@ def assign_all_courts():
     courts = data["courts"]
     for i in range(len(courts)):
         if len(courts[i]) < 4 and len(queue) >= 4:
-            courts[i] = [queue.pop(0) for _ in range(4)]
-    save_json(DATA_FILE, data)
+            courts[i] = [dequeue() for _ in range(4)]
 
 def auto_fill_if_enabled():
     if st.session_state.data.get("auto_fill", False):
@@ -76,43 +282,48 @@ def process_court_winner(court_index, winning_team):
     losers = team2 if winning_team == "Team 1" else team1
 
     # Determine staying winners and leaving winners (max 2 games)
-    staying_winners = [p for p in winners if data["streaks"].get(p,0) < 2]
-    leaving_winners = [p for p in winners if data["streaks"].get(p,0) >= 2]
-
-    # Increment streaks for staying winners
-    for player in staying_winners:
-        data["streaks"][player] = data["streaks"].get(player,0) + 1
+    streaks = data["streaks"]
+    new_streaks = {p: streaks.get(p, 0) + 1 for p in winners}
+    staying_winners = [p for p, streak in new_streaks.items() if streak <= 2]
+    leaving_winners = [p for p, streak in new_streaks.items() if streak > 2]
+    streaks.update(new_streaks)
 
     # Reset streaks for leaving winners and losers; send to back of queue
     for player in losers + leaving_winners:
-        data["streaks"][player] = 0
-        if player not in data["queue"]:
-            data["queue"].append(player)
+        streaks[player] = 0
+        enqueue(player)
 
     # Fill court up to 4 players from queue
     needed = 4 - len(staying_winners)
     new_players = []
     for _ in range(needed):
         if len(data["queue"]) > 0:
-            new_players.append(data["queue"].pop(0))
+            new_players.append(dequeue())
 
     data["courts"][court_index] = staying_winners + new_players
 
     # Record in history
-    data["history"].append({
+    append_history(HISTORY_FILE, [{
         "court": court_index + 1,
         "team_won": winning_team,
         "players": court_players.copy()
-    })
+    }])
 
 def update_all_courts():
-    for i in range(len(data["courts"])):
-        winner = st.session_state.get(f"court_winner_{i}", "")
-        if winner in ["Team 1", "Team 2"]:
-            process_court_winner(i, winner)
-            st.session_state[f"court_winner_{i}"] = ""  # clear selection
-    save_json(DATA_FILE, data)
-    auto_fill_if_enabled()
+    any_changed = False
+    with st.session_state.lock:
+        for i in range(len(data["courts"])):
+            winner = st.session_state.get(f"court_winner_{i}", "")
+            if winner in ["Team 1", "Team 2"]:
+                process_court_winner(i, winner)
+                st.session_state[f"court_winner_{i}"] = ""  # clear selection
+                any_changed = True
+        if any_changed:
+            auto_fill_if_enabled()
+            mark_dirty()
+    if not any_changed:
+        st.info("No winners selected.")
+        return
     st.success("All courts updated!")
 
 def reset_single_court(court_index):
@@ -120,25 +331,36 @@ def reset_single_court(court_index):
     court_players = data["courts"][court_index]
     for player in court_players:
         data["streaks"][player] = 0
-        if player not in data["queue"]:
-            data["queue"].append(player)
+        enqueue(player)
     data["courts"][court_index] = []
-    save_json(DATA_FILE, data)
     auto_fill_if_enabled()
 
 def reset_all_courts():
-    for i in range(len(data["courts"])):
-        reset_single_court(i)
+    with st.session_state.lock:
+        for i in range(len(data["courts"])):
+            reset_single_court(i)
+        priority_flush()
     st.success("All courts reset — players moved to back of queue.")
 
 # ---------------------------
 # Sidebar Config
 # ---------------------------
 st.sidebar.header("⚙️ Configuration")
-st.session_state.data["auto_fill"] = st.sidebar.checkbox("Auto-Fill Courts Continuously", value=data.get("auto_fill", False))
-
-if st.sidebar.button("Reset All Data"):
-    reset_everything()
+def set_auto_fill():
+    with st.session_state.lock:
+        st.session_state.data["auto_fill"] = st.session_state.auto_fill_checkbox
+        mark_dirty()
+
+# The data is shared with other sessions, so show its current value rather
+# than whatever this session's widget last held.
+st.session_state.auto_fill_checkbox = data.get("auto_fill", False)
+st.sidebar.checkbox(
+    "Auto-Fill Courts Continuously",
+    key="auto_fill_checkbox",
+    on_change=set_auto_fill,
+)
+
+st.sidebar.button("Reset All Data", on_click=reset_everything)
 if st.sidebar.button("Reset All Courts"):
     reset_all_courts()
 
@@ -147,13 +369,25 @@ with st.sidebar.expander("Player Management"):
     bulk_input = st.text_area("Enter player names", height=150, placeholder="Player 1\nPlayer 2\nPlayer 3...")
     if st.button("Add Players", key="add_players_sidebar"):
         new_players = [p.strip() for p in bulk_input.splitlines() if p.strip()]
-        for player in new_players:
-            if player not in data["players"]:
-                data["players"].append(player)
-                data["queue"].append(player)
-                data["streaks"][player] = 0
-        save_json(DATA_FILE, data)
-        st.success(f"Added {len(new_players)} players.")
+        # Skip names already on the roster or repeated in the input
+        with st.session_state.lock:
+            existing = set(data["players"])
+            to_add = [p for p in dict.fromkeys(new_players) if p not in existing]
+            if to_add:
+                data["players"].extend(to_add)
+                data["queue"].extend(to_add)
+                st.session_state.queue_set.update(to_add)
+                data["streaks"].update(dict.fromkeys(to_add, 0))
+                mark_dirty()
+        st.success(f"Added {len(to_add)} players.")
+
+if st.sidebar.button("Export Data as JSON"):
+    st.sidebar.download_button(
+        "Download pickleball_data.json",
+        export_json(data, load_history(HISTORY_FILE)),
+        file_name="pickleball_data.json",
+        mime="application/json",
+    )
 
 # ---------------------------
 # Main Page
@@ -164,42 +398,60 @@ tabs = st.tabs(["Courts", "Queue", "History"])
 # ---------------------------
 # Courts Tab
 # ---------------------------
+def reset_court(i):
+    with st.session_state.lock:
+        reset_single_court(i)
+        mark_dirty()
+    st.toast(f"Court {i + 1} reset.")
+    # The reset moves players into the queue (and auto-fill may refill other
+    # courts), so the whole page needs redrawing, not just this court
+    st.session_state.rerun_app = True
+
+# Each court is a fragment, so picking a winner only reruns that court
+# instead of the whole page.
+@st.fragment
+def render_court(i):
+    # st.rerun() is a no-op inside a callback, so reset_court leaves a flag
+    if st.session_state.pop("rerun_app", False):
+        st.rerun()
+    court_players = st.session_state.data["courts"][i]
+    st.markdown(f"### Court {i + 1}")
+
+    if len(court_players) == 0:
+        st.info("Empty court")
+    else:
+        col1, col2 = st.columns(2)
+        col1.markdown(f"**Team 1:** {', '.join(court_players[:2])}")
+        col2.markdown(f"**Team 2:** {', '.join(court_players[2:])}")
+
+        # Winner dropdown with persistent key
+        winner_key = f"court_winner_{i}"
+        if winner_key not in st.session_state:
+            st.session_state[winner_key] = ""
+        st.session_state[winner_key] = st.selectbox(
+            f"Select winner (Court {i + 1})",
+            ["", "Team 1", "Team 2"],
+            index=["", "Team 1", "Team 2"].index(st.session_state[winner_key]),
+            key=winner_key+"_selectbox"
+        )
+
+        col1b, col2b = st.columns(2)
+        with col1b:
+            st.button(f"Reset Court {i + 1}", key=f"reset_{i}", on_click=reset_court, args=(i,))
+
 with tabs[0]:
     st.subheader("Active Courts")
     num_courts = len(data["courts"])
 
     if st.button("Assign all empty courts"):
-        assign_all_courts()
+        with st.session_state.lock:
+            assign_all_courts()
+            mark_dirty()
         st.success("Courts filled from queue.")
     st.divider()
 
     for i in range(num_courts):
-        court_players = data["courts"][i]
-        st.markdown(f"### Court {i + 1}")
-
-        if len(court_players) == 0:
-            st.info("Empty court")
-        else:
-            col1, col2 = st.columns(2)
-            col1.markdown(f"**Team 1:** {', '.join(court_players[:2])}")
-            col2.markdown(f"**Team 2:** {', '.join(court_players[2:])}")
-
-            # Winner dropdown with persistent key
-            winner_key = f"court_winner_{i}"
-            if winner_key not in st.session_state:
-                st.session_state[winner_key] = ""
-            st.session_state[winner_key] = st.selectbox(
-                f"Select winner (Court {i + 1})",
-                ["", "Team 1", "Team 2"],
-                index=["", "Team 1", "Team 2"].index(st.session_state[winner_key]),
-                key=winner_key+"_selectbox"
-            )
-
-            col1b, col2b = st.columns(2)
-            with col1b:
-                if st.button(f"Reset Court {i + 1}", key=f"reset_{i}"):
-                    reset_single_court(i)
-                    st.info(f"Court {i + 1} reset.")
+        render_court(i)
 
     if st.button("Update All Courts"):
         update_all_courts()
@@ -209,25 +461,16 @@ with tabs[0]:
 # ---------------------------
 with tabs[1]:
     st.subheader("Queue (Next Up)")
-    st.write(", ".join(data["queue"]))
+    st.text("\n".join(data["queue"]))
 
 # ---------------------------
 # History Tab
 # ---------------------------
 with tabs[2]:
     st.subheader("Game History")
-    if data["history"]:
-        history_rows = []
-        for entry in data["history"]:
-            history_rows.append({
-                "Court": entry["court"],
-                "Winner": entry["team_won"],
-                "Player 1": entry["players"][0],
-                "Player 2": entry["players"][1],
-                "Player 3": entry["players"][2],
-                "Player 4": entry["players"][3],
-            })
-        df_history = pd.DataFrame(history_rows)
+    history_stat = HISTORY_FILE.stat() if HISTORY_FILE.exists() else None
+    if history_stat and history_stat.st_size:
+        df_history = history_table(HISTORY_FILE, history_stat.st_mtime_ns, history_stat.st_size)
         st.dataframe(df_history)
     else:
         st.info("No games played yet.")